@@ -34,77 +34,371 @@ NUEVA FUNCIONALIDAD DE REENVÍOS:
 import logging
 import os
 import asyncio
-import aiohttp
+import atexit
+import queue
 import json
 import hashlib
+import itertools
+import random
+import time
+import contextlib
+from dataclasses import dataclass, field, asdict, is_dataclass
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
+import httpx
 from telegram import Update, Message
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-from notion_client import Client
+from telegram.ext import AIORateLimiter, Application, CommandHandler, MessageHandler, filters, ContextTypes
+from notion_client import AsyncClient
+from notion_client.errors import APIErrorCode, HTTPResponseError
 from dotenv import load_dotenv
 
+try:
+    import orjson
+except ImportError:  # Opcional: se usa el json de la librería estándar
+    orjson = None
+
+try:
+    import uvloop
+except ImportError:  # Opcional: no disponible en Windows
+    uvloop = None
+
 # Cargar variables de entorno
 load_dotenv()
 
-# Configuración del logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bot.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+# Configuración del logging: el event loop solo encola los registros y un
+# hilo (QueueListener) los formatea y escribe en archivo y consola
+_log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+_log_handlers = [
+    logging.FileHandler('bot.log', encoding='utf-8'),
+    logging.StreamHandler()
+]
+for _handler in _log_handlers:
+    _handler.setFormatter(_log_formatter)
+
+_log_queue = queue.SimpleQueue()
+_root_logger = logging.getLogger()
+# Un LOG_LEVEL desconocido no debe impedir el arranque: se usa INFO
+_log_level_name = (os.getenv('LOG_LEVEL') or 'INFO').upper()
+_log_level = getattr(logging, _log_level_name, None)
+_root_logger.setLevel(_log_level if isinstance(_log_level, int) else logging.INFO)
+_root_logger.addHandler(QueueHandler(_log_queue))
+_log_listener = QueueListener(_log_queue, *_log_handlers)
+_log_listener.start()
+# Al salir se vacía la cola pendiente antes de cerrar
+atexit.register(_log_listener.stop)
 logger = logging.getLogger(__name__)
+if not isinstance(_log_level, int):
+    logger.warning("⚠️ LOG_LEVEL desconocido (%s), se usa INFO", _log_level_name)
+
+# =============================================================================
+# CONFIGURACIÓN
+# =============================================================================
+
+@dataclass(frozen=True, slots=True)
+class BotConfig:
+    """Configuración del bot leída de las variables de entorno"""
+    telegram_token: Optional[str]
+    notion_tokens: tuple
+    database_id: str
+
+
+@lru_cache(maxsize=None)
+def get_config() -> BotConfig:
+    """Lee el entorno una sola vez y devuelve siempre la misma configuración"""
+    return BotConfig(
+        telegram_token=os.getenv('TELEGRAM_BOT_TOKEN'),
+        # NOTION_TOKEN admite varios tokens de integración separados por comas:
+        # cada uno aporta su propio límite de peticiones por segundo
+        notion_tokens=tuple(t.strip() for t in os.getenv('NOTION_TOKEN', '').split(',') if t.strip()),
+        database_id=os.getenv('NOTION_DATABASE_ID', '27aa8baa-ff5a-808b-8cc4-d3cc8f010fa0')
+    )
+
+
+# =============================================================================
+# ESTADO POR MENSAJE
+# =============================================================================
+
+@dataclass(slots=True)
+class SenderInfo:
+    """Usuario que envía (o envió originalmente) el mensaje"""
+    user_id: int
+    username: Optional[str]
+    full_name: str
+    is_bot: Optional[bool] = None
+    language_code: Optional[str] = None
+
+
+@dataclass(slots=True)
+class ChatInfo:
+    """Chat en el que se recibe (o del que procede) el mensaje"""
+    chat_id: int
+    chat_type: Optional[str]
+    title: Optional[str]
+    username: Optional[str]
+
+
+@dataclass(frozen=True, slots=True)
+class OriginInfo:
+    """Origen de un mensaje reenviado (API moderna forward_origin)"""
+    origin_sender_user_id: Optional[int] = None
+    origin_sender_name: Optional[str] = None
+    origin_sender_username: Optional[str] = None
+    origin_chat_id: Optional[int] = None
+    origin_chat_title: Optional[str] = None
+    origin_chat_username: Optional[str] = None
+    origin_date: Optional[datetime] = None
+
+
+@dataclass(frozen=True, slots=True)
+class ForwardInfo:
+    """Información de reenvío consolidada"""
+    is_forwarded: bool = False
+    forward_date: Optional[datetime] = None
+    is_automatic_forward: Optional[bool] = None
+    unique_identifier: Optional[str] = None
+    origin_info: OriginInfo = field(default_factory=OriginInfo)
+    # Campos de la API antigua (compatibilidad)
+    legacy_sender: Optional[SenderInfo] = None
+    legacy_chat: Optional[ChatInfo] = None
+    legacy_sender_name: Optional[str] = None
+
+
+@dataclass(slots=True)
+class MessageData:
+    """Información extraída de un mensaje de Telegram"""
+    timestamp: datetime
+    message_id: int
+    date: Optional[datetime]
+    sender: Optional[SenderInfo]
+    chat: ChatInfo
+    forwarding: ForwardInfo
+    # Calculados una sola vez en handle_image para el worker de Notion
+    user_name: Optional[str] = None
+    record_title: Optional[str] = None
+
+
+# Información de reenvío compartida (inmutable) para mensajes no reenviados
+_NOT_FORWARDED = ForwardInfo()
+
+# Separador de los volcados de depuración
+_BANNER = "=" * 80
+
+
+def _json_default(obj):
+    """Convierte a JSON los tipos no nativos (dataclasses, fechas...)"""
+    if is_dataclass(obj):
+        return asdict(obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    return str(obj)
+
+
+def _dump_json(data) -> str:
+    """Serializa a JSON indentado (orjson si está disponible)"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2, default=_json_default).decode()
+    return json.dumps(data, indent=2, ensure_ascii=False, default=_json_default)
+
+
+class _RateLimiter:
+    """Espacia las peticiones para no superar `rate` por segundo (un turno cada 1/rate s)"""
+    
+    __slots__ = ('_interval', '_next_slot')
+    
+    def __init__(self, rate: float):
+        self._interval = 1.0 / rate
+        self._next_slot = 0.0
+    
+    async def acquire(self):
+        # El turno se reserva antes de esperar: sin lock, ya que el event loop
+        # no cambia de tarea entre la lectura y la actualización
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self._interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+    
+    async def __call__(self, request: httpx.Request):
+        """Permite usar el limitador como hook de petición de httpx"""
+        await self.acquire()
+
+
+@dataclass(slots=True)
+class NotionConnection:
+    """Conexión con Notion de un token de integración (cada una con su propio límite)"""
+    http: httpx.AsyncClient
+    client: AsyncClient
 
 
 class TelegramNotionBot:
     """Bot principal de Telegram con integración completa a Notion"""
     
+    # Propiedades estáticas de cada registro (no se modifican, se comparten)
+    _PROPS_SKELETON = {
+        "Resultado": {
+            "select": {
+                "name": "Pendiente"
+            }
+        },
+        "Tipo de apuesta": {
+            "select": {
+                "name": "Simple"
+            }
+        }
+    }
+    
+    # Extensiones aceptadas para imágenes enviadas como documento
+    _IMAGE_EXTS = frozenset({'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tiff'})
+    
+    # Máximo de imágenes que _notion_worker procesa por lote
+    _NOTION_BATCH_SIZE = 16
+    
+    # Imágenes como máximo esperando en la cola de Notion
+    _NOTION_QUEUE_SIZE = 1000
+    
+    # Envíos a Notion simultáneos por token dentro de un lote (Notion admite ~3 req/s)
+    _NOTION_CONCURRENCY = 3
+    
+    # Peticiones por segundo permitidas por Notion para cada integración
+    _NOTION_RATE_LIMIT = 3
+    
+    # Reintentos ante respuestas transitorias de Notion (429 y 5xx)
+    _NOTION_MAX_RETRIES = 5
+    _RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+    # Las creaciones no son idempotentes: un 502/504 del proxy puede llegar cuando
+    # Notion ya creó el objeto, así que solo se reintentan ante 429 (no procesado)
+    _CREATE_RETRY_STATUSES = frozenset({429})
+    
+    # Segundos que se reutiliza el esquema de la base de datos (databases.retrieve)
+    _DATABASE_TTL = 300
+    
+    # Longitud máxima de text.content que acepta Notion
+    _NOTION_TEXT_LIMIT = 2000
+    
     def __init__(self):
         """Inicializa el bot con todas las configuraciones necesarias"""
         logger.info("🤖 Inicializando Bot de Telegram con Notion...")
         
         # Variables de entorno
-        self.telegram_token = os.getenv('TELEGRAM_BOT_TOKEN')
-        self.notion_token = os.getenv('NOTION_TOKEN') 
-        self.database_id = os.getenv('NOTION_DATABASE_ID', '27aa8baa-ff5a-808b-8cc4-d3cc8f010fa0')
+        config = get_config()
+        self.telegram_token = config.telegram_token
+        self.notion_tokens = config.notion_tokens
+        self.database_id = config.database_id
         
         # Validación de configuración
         self._validate_config()
         
-        # Cliente Notion
-        self.notion_client = None
+        # Configuración para API de Notion (subida de archivos)
+        self.notion_api_base = "https://api.notion.com/v1"
+        self.notion_version = "2022-06-28"
+        
+        # Una conexión por token, repartidas por turnos entre los envíos
         try:
-            self.notion_client = Client(auth=self.notion_token)
-            logger.info("✅ Cliente Notion inicializado")
+            self._notion_pool = [self._create_notion_connection(token) for token in self.notion_tokens]
+            logger.info("✅ Cliente Notion inicializado (%d token(s) de integración)", len(self._notion_pool))
         except Exception as e:
-            logger.error(f"❌ Error inicializando Notion: {e}")
+            logger.error("❌ Error inicializando Notion: %s", e)
             raise
+        self._notion_cycle = itertools.cycle(self._notion_pool)
         
-        # Configuración para API de Notion (subida de archivos)
-        self.notion_api_base = "https://api.notion.com/v1"
-        self.notion_headers = {
-            "Authorization": f"Bearer {self.notion_token}",
-            "Notion-Version": "2022-06-28"
-        }
+        # Cliente SDK para /status (esquema de la base de datos)
+        self.notion_client = self._notion_pool[0].client
+        
+        # Cola de envíos a Notion (se crea junto al worker en _post_init)
+        self._notion_queue: Optional[asyncio.Queue] = None
+        self._notion_worker_task: Optional[asyncio.Task] = None
+        self._notion_semaphore: Optional[asyncio.Semaphore] = None
+        
+        # Trabajos ya sacados de la cola por el worker que aún no han terminado
+        self._notion_active_jobs = 0
+        
+        # file_unique_id de las imágenes en curso (descarga, cola o subida)
+        self._inflight_images: set = set()
         
-        # Carpeta para imágenes
-        self.images_path = Path("storage/images")
+        # Caché de databases.retrieve (se invalida ante errores de validación)
+        self._database_info: Optional[dict] = None
+        self._database_info_ts = 0.0
+        
+        # Carpeta para imágenes (ruta absoluta resuelta una sola vez)
+        self.images_path = Path("storage/images").resolve()
         self.images_path.mkdir(exist_ok=True)
         
-        logger.info(f"📁 Carpeta de imágenes: {self.images_path.absolute()}")
+        logger.info("📁 Carpeta de imágenes: %s", self.images_path)
         logger.info("✅ Bot inicializado correctamente")
     
+    def _create_notion_connection(self, token: str) -> NotionConnection:
+        """Crea el cliente HTTP y el cliente Notion de un token de integración"""
+        # Cliente HTTP/2: subida de archivos y creación de páginas viajan
+        # multiplexadas sobre una única conexión TLS con Notion; cada petición
+        # (también las del SDK) espera antes turno en el limitador del token
+        http = httpx.AsyncClient(
+            base_url=self.notion_api_base,
+            headers={
+                "Authorization": f"Bearer {token}",
+                "Notion-Version": self.notion_version
+            },
+            http2=True,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            timeout=30,
+            event_hooks={'request': [_RateLimiter(self._NOTION_RATE_LIMIT)]}
+        )
+        
+        notion_options = dict(
+            auth=token,
+            client=http,
+            notion_version=self.notion_version,
+            timeout_ms=30_000
+        )
+        try:
+            # Las versiones recientes del SDK reintentan por su cuenta: se
+            # desactiva para que _notion_call sea la única política de reintentos
+            client = AsyncClient(**notion_options, retry=False)
+        except TypeError:
+            client = AsyncClient(**notion_options)
+        return NotionConnection(http=http, client=client)
+    
+    async def _notion_call(self, call, retry_statuses: frozenset = _RETRY_STATUSES):
+        """
+        Ejecuta una llamada a Notion reintentando los errores transitorios:
+        429 respeta Retry-After y 5xx usa backoff exponencial con jitter.
+        `call` devuelve una corrutina nueva en cada intento (httpx o SDK);
+        `retry_statuses` limita los estados reintentables (creaciones: solo 429).
+        """
+        for attempt in range(self._NOTION_MAX_RETRIES + 1):
+            last_attempt = attempt == self._NOTION_MAX_RETRIES
+            try:
+                result = await call()
+            except HTTPResponseError as e:
+                if last_attempt or e.status not in retry_statuses:
+                    raise
+                status, headers = e.status, e.headers
+            else:
+                if last_attempt or not isinstance(result, httpx.Response) or result.status_code not in retry_statuses:
+                    return result
+                status, headers = result.status_code, result.headers
+            
+            if status == 429:
+                try:
+                    delay = float(headers.get("retry-after", 1))
+                except ValueError:
+                    delay = 1.0
+            else:
+                delay = min(60, 2 ** attempt + random.random() * 0.5)
+            
+            logger.warning("⏳ Notion respondió %s, reintento %d/%d en %.1fs",
+                           status, attempt + 1, self._NOTION_MAX_RETRIES, delay)
+            await asyncio.sleep(delay)
+    
     def _validate_config(self):
         """Valida que todas las variables de entorno estén configuradas"""
         if not self.telegram_token or self.telegram_token.startswith('your_'):
             raise ValueError("TELEGRAM_BOT_TOKEN no configurado correctamente")
         
-        if not self.notion_token or self.notion_token.startswith('your_'):
+        if not self.notion_tokens or any(t.startswith('your_') for t in self.notion_tokens):
             raise ValueError("NOTION_TOKEN no configurado correctamente")
         
         if not self.database_id:
@@ -116,173 +410,175 @@ class TelegramNotionBot:
     # EXTRACCIÓN DE INFORMACIÓN DE MENSAJES REENVIADOS
     # =============================================================================
     
-    def _extract_forward_info(self, message: Message) -> dict:
+    @staticmethod
+    def _full_name(user) -> str:
+        """Nombre completo de un usuario de Telegram ("" si no tiene)"""
+        return " ".join(filter(None, (user.first_name, user.last_name)))
+    
+    @classmethod
+    def _sender_info(cls, user) -> SenderInfo:
+        """Construye SenderInfo a partir de un usuario de Telegram"""
+        return SenderInfo(
+            user_id=user.id,
+            username=user.username,
+            full_name=cls._full_name(user),
+            is_bot=user.is_bot,
+            language_code=user.language_code
+        )
+    
+    @staticmethod
+    def _chat_info(chat) -> ChatInfo:
+        """Construye ChatInfo a partir de un chat de Telegram"""
+        return ChatInfo(
+            chat_id=chat.id,
+            chat_type=chat.type,
+            title=chat.title,
+            username=chat.username
+        )
+    
+    def _extract_forward_info(self, message: Message, now: Optional[datetime] = None) -> MessageData:
         """Extrae información completa de mensajes reenviados"""
-        # Información básica del mensaje
-        message_data = {
-            "timestamp": datetime.now().isoformat(),
-            "message_id": message.message_id,
-            "date": message.date.isoformat() if message.date else None,
-        }
-        
-        # Información del usuario que envía
+        now = now or datetime.now()
         user = message.from_user
-        if user:
-            message_data["sender"] = {
-                "user_id": user.id,
-                "username": getattr(user, 'username', None),
-                "full_name": f"{getattr(user, 'first_name', '') or ''} {getattr(user, 'last_name', '') or ''}".strip(),
-                "is_bot": getattr(user, 'is_bot', None),
-                "language_code": getattr(user, 'language_code', None)
-            }
         
-        # Información del chat
-        chat = message.chat
-        message_data["chat"] = {
-            "chat_id": chat.id,
-            "chat_type": chat.type,
-            "title": getattr(chat, 'title', None),
-            "username": getattr(chat, 'username', None)
-        }
-        
-        # **INFORMACIÓN DE REENVÍO - PARTE PRINCIPAL**
-        forward_info = self._analyze_forward_origin(message)
-        message_data["forwarding"] = forward_info
-        
-        return message_data
+        return MessageData(
+            # Información básica del mensaje
+            timestamp=now,
+            message_id=message.message_id,
+            date=message.date,
+            # Información del usuario que envía
+            sender=self._sender_info(user) if user else None,
+            # Información del chat
+            chat=self._chat_info(message.chat),
+            # **INFORMACIÓN DE REENVÍO - PARTE PRINCIPAL**
+            # Camino rápido para el caso común: todo reenvío trae forward_origin
+            # (los campos antiguos solo acompañan a forward_origin en PTB < 22)
+            forwarding=(
+                self._analyze_forward_origin(message)
+                if message.forward_origin or message.is_automatic_forward
+                else _NOT_FORWARDED
+            )
+        )
     
-    def _analyze_forward_origin(self, message: Message) -> dict:
+    def _analyze_forward_origin(self, message: Message) -> ForwardInfo:
         """Analiza el origen del mensaje reenviado"""
-        # Campos de reenvío estándar
+        # Campos de reenvío antiguos: python-telegram-bot 22 ya no los expone,
+        # por eso se leen con getattr (solo existen en versiones anteriores)
         forward_from = getattr(message, 'forward_from', None)
         forward_from_chat = getattr(message, 'forward_from_chat', None)
         forward_sender_name = getattr(message, 'forward_sender_name', None)
         forward_date = getattr(message, 'forward_date', None)
-        is_automatic_forward = getattr(message, 'is_automatic_forward', False)
         
-        # Campo moderno de origen
-        forward_origin = getattr(message, 'forward_origin', None)
+        # Campos actuales de la Bot API (siempre presentes, None si no aplican)
+        is_automatic_forward = message.is_automatic_forward
+        forward_origin = message.forward_origin
+        
+        # Determinar si es mensaje reenviado
+        is_forwarded = any((
+            forward_origin, is_automatic_forward, forward_from,
+            forward_from_chat, forward_sender_name, forward_date
+        ))
+        
+        # Mensaje normal (caso más común): no se construye ningún objeto
+        if not is_forwarded:
+            return _NOT_FORWARDED
         
-        # Inicializar información de origen
-        origin_info = {}
+        # Campos del origen (solo se rellenan los disponibles)
+        origin_fields = {}
         
         # Analizar forward_origin (API moderna)
         if forward_origin:
             if hasattr(forward_origin, 'sender_user') and forward_origin.sender_user:
                 # Usuario específico (sin privacidad)
                 sender_user = forward_origin.sender_user
-                origin_info["origin_sender_user_id"] = sender_user.id
-                origin_info["origin_sender_name"] = f"{getattr(sender_user, 'first_name', '') or ''} {getattr(sender_user, 'last_name', '') or ''}".strip()
-                origin_info["origin_sender_username"] = getattr(sender_user, 'username', None)
+                origin_fields["origin_sender_user_id"] = sender_user.id
+                origin_fields["origin_sender_name"] = self._full_name(sender_user)
+                origin_fields["origin_sender_username"] = sender_user.username
                 
             elif hasattr(forward_origin, 'sender_user_name') and forward_origin.sender_user_name:
                 # Usuario con privacidad activada (solo nombre visible)
-                origin_info["origin_sender_name"] = getattr(forward_origin, 'sender_user_name', None)
+                origin_fields["origin_sender_name"] = forward_origin.sender_user_name
                 
             elif hasattr(forward_origin, 'chat') and forward_origin.chat:
                 # Canal o grupo
                 chat = forward_origin.chat
-                origin_info["origin_chat_id"] = chat.id
-                origin_info["origin_chat_title"] = getattr(chat, 'title', None)
-                origin_info["origin_chat_username"] = getattr(chat, 'username', None)
+                origin_fields["origin_chat_id"] = chat.id
+                origin_fields["origin_chat_title"] = chat.title
+                origin_fields["origin_chat_username"] = chat.username
         
         # Fecha del origen
-        origin_date = getattr(forward_origin, 'date', None) if forward_origin else None
+        origin_date = forward_origin.date if forward_origin else None
         if origin_date:
-            origin_info["origin_date"] = origin_date.isoformat()
+            origin_fields["origin_date"] = origin_date
         
-        # Determinar si es mensaje reenviado
-        is_forwarded = bool(
-            forward_from or forward_from_chat or forward_sender_name or 
-            forward_date or forward_origin or is_automatic_forward
-        )
+        origin_info = OriginInfo(**origin_fields)
         
         # Generar identificador único para el reenvío
         unique_identifier = None
-        if is_forwarded:
-            identifier_parts = []
-            
-            if origin_info.get("origin_sender_user_id"):
-                identifier_parts.append(f"USER_{origin_info['origin_sender_user_id']}")
-            elif origin_info.get("origin_sender_name"):
-                # Hash del nombre para usuarios privados
-                sender_name = origin_info["origin_sender_name"]
-                if sender_name:
-                    name_hash = hashlib.md5(sender_name.encode('utf-8')).hexdigest()[:8]
-                    identifier_parts.append(f"PRIVATE_{name_hash}")
-            elif origin_info.get("origin_chat_id"):
-                identifier_parts.append(f"CHAT_{origin_info['origin_chat_id']}")
-            
-            # Agregar fecha
-            date_str = origin_info.get("origin_date") or (forward_date.isoformat() if forward_date else None)
-            if date_str:
-                identifier_parts.append(f"DATE_{date_str[:10]}")
-            
-            if identifier_parts:
-                unique_identifier = "_".join(identifier_parts)
-        
-        # Información de reenvío consolidada
-        forward_info = {
-            "is_forwarded": is_forwarded,
-            "forward_date": forward_date.isoformat() if forward_date else None,
-            "is_automatic_forward": is_automatic_forward,
-            "unique_identifier": unique_identifier,
-            "origin_info": origin_info
-        }
+        identifier_parts = []
         
-        # Información de métodos antiguos (compatibilidad)
-        if forward_from:
-            forward_info["legacy_sender"] = {
-                "user_id": forward_from.id,
-                "username": getattr(forward_from, 'username', None),
-                "full_name": f"{getattr(forward_from, 'first_name', '') or ''} {getattr(forward_from, 'last_name', '') or ''}".strip()
-            }
+        if origin_info.origin_sender_user_id:
+            identifier_parts.append(f"USER_{origin_info.origin_sender_user_id}")
+        elif origin_info.origin_sender_name:
+            # Hash del nombre para usuarios privados
+            name_hash = hashlib.blake2b(origin_info.origin_sender_name.encode('utf-8'), digest_size=4).hexdigest()
+            identifier_parts.append(f"PRIVATE_{name_hash}")
+        elif origin_info.origin_chat_id:
+            identifier_parts.append(f"CHAT_{origin_info.origin_chat_id}")
         
-        if forward_from_chat:
-            forward_info["legacy_chat"] = {
-                "chat_id": forward_from_chat.id,
-                "title": getattr(forward_from_chat, 'title', None),
-                "username": getattr(forward_from_chat, 'username', None)
-            }
+        # Agregar fecha
+        id_date = origin_info.origin_date or forward_date
+        if id_date:
+            identifier_parts.append(f"DATE_{id_date:%Y-%m-%d}")
         
-        if forward_sender_name:
-            forward_info["legacy_sender_name"] = forward_sender_name
+        if identifier_parts:
+            unique_identifier = "_".join(identifier_parts)
         
-        return forward_info
+        # Información de reenvío consolidada
+        return ForwardInfo(
+            is_forwarded=is_forwarded,
+            forward_date=forward_date,
+            is_automatic_forward=is_automatic_forward,
+            unique_identifier=unique_identifier,
+            origin_info=origin_info,
+            # Información de métodos antiguos (compatibilidad)
+            legacy_sender=self._sender_info(forward_from) if forward_from else None,
+            legacy_chat=self._chat_info(forward_from_chat) if forward_from_chat else None,
+            legacy_sender_name=forward_sender_name
+        )
     
-    def _format_forward_response(self, forward_info: dict) -> str:
+    def _format_forward_response(self, forward_info: ForwardInfo) -> str:
         """Formatea la respuesta sobre el reenvío para el usuario"""
-        if not forward_info.get("is_forwarded"):
+        if not forward_info.is_forwarded:
             return ""
         
-        origin = forward_info.get("origin_info", {})
-        unique_id = forward_info.get("unique_identifier")
+        # Campos del origen leídos una sola vez
+        origin = forward_info.origin_info
+        sender_user_id = origin.origin_sender_user_id
+        sender_name = origin.origin_sender_name
+        chat_id = origin.origin_chat_id
         
         # Priorizar información moderna
-        if origin.get("origin_sender_user_id"):
+        if sender_user_id:
             # Usuario con ID conocido
-            user_id = origin["origin_sender_user_id"]
-            username = origin.get("origin_sender_username")
-            name = origin.get("origin_sender_name")
+            username = origin.origin_sender_username
             
-            user_info = f"ID: {user_id}"
+            user_info = f"ID: {sender_user_id}"
             if username:
                 user_info += f" (@{username})"
-            elif name:
-                user_info += f" ({name})"
+            elif sender_name:
+                user_info += f" ({sender_name})"
             
             return f"\n\n🔄 **Mensaje reenviado de usuario**\n👤 {user_info}"
             
-        elif origin.get("origin_sender_name"):
+        elif sender_name:
             # Usuario con privacidad (solo nombre)
-            name = origin["origin_sender_name"]
-            return f"\n\n🔄 **Mensaje reenviado**\n👤 Usuario: {name} (perfil privado)"
+            return f"\n\n🔄 **Mensaje reenviado**\n👤 Usuario: {sender_name} (perfil privado)"
             
-        elif origin.get("origin_chat_id"):
+        elif chat_id:
             # Canal o grupo
-            chat_id = origin["origin_chat_id"]
-            title = origin.get("origin_chat_title")
-            username = origin.get("origin_chat_username")
+            title = origin.origin_chat_title
+            username = origin.origin_chat_username
             
             chat_info = f"ID: {chat_id}"
             if username:
@@ -293,11 +589,11 @@ class TelegramNotionBot:
             return f"\n\n🔄 **Mensaje reenviado de canal/grupo**\n📢 {chat_info}"
         
         # Fallback a métodos antiguos
-        legacy = forward_info.get("legacy_sender")
+        legacy = forward_info.legacy_sender
         if legacy:
-            return f"\n\n🔄 **Mensaje reenviado**\n👤 {legacy.get('full_name', 'Usuario')} (ID: {legacy.get('user_id')})"
+            return f"\n\n🔄 **Mensaje reenviado**\n👤 {legacy.full_name or 'Usuario'} (ID: {legacy.user_id})"
         
-        return f"\n\n🔄 **Mensaje reenviado**\n📝 ID único: {unique_id or 'N/A'}"
+        return f"\n\n🔄 **Mensaje reenviado**\n📝 ID único: {forward_info.unique_identifier or 'N/A'}"
 
     # =============================================================================
     # COMANDOS DEL BOT
@@ -326,7 +622,7 @@ class TelegramNotionBot:
         user_name = "Usuario"
         if update.effective_user and update.effective_user.first_name:
             user_name = update.effective_user.first_name
-        logger.info(f"👋 Usuario {user_name} inició el bot")
+        logger.info("👋 Usuario %s inició el bot", user_name)
     
     async def cmd_help(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Comando /help - Ayuda detallada"""
@@ -351,35 +647,46 @@ class TelegramNotionBot:
         )
         await update.message.reply_text(help_message, parse_mode='Markdown')
     
-    async def cmd_status(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Comando /status - Estado del sistema"""
-        if not update.message:
-            return
-            
+    async def _get_database_info(self) -> dict:
+        """Esquema de la base de datos de Notion, cacheado durante _DATABASE_TTL segundos"""
+        now = time.monotonic()
+        if self._database_info is None or now - self._database_info_ts >= self._DATABASE_TTL:
+            self._database_info = await self._notion_call(
+                lambda: self.notion_client.databases.retrieve(self.database_id)
+            )
+            self._database_info_ts = now
+        return self._database_info
+    
+    async def _get_notion_status(self) -> tuple:
+        """Estado de la conexión con Notion para /status"""
         try:
             # Probar conexión con Notion
-            if self.notion_client:
-                database = self.notion_client.databases.retrieve(self.database_id)
-                # database es un dict, no un awaitable
-                if isinstance(database, dict):
-                    database_name = database.get('title', [{}])[0].get('plain_text', 'Base de datos') if database.get('title') else 'Base de datos'
-                else:
-                    database_name = "Base de datos"
-                notion_status = "✅ Conectado"
-            else:
-                database_name = "Error"
-                notion_status = "❌ Cliente no inicializado"
+            database = await self._get_database_info()
+            title = database.get('title')
+            database_name = title[0]['plain_text'] if title else 'Base de datos'
+            notion_status = "✅ Conectado"
         except Exception as e:
             database_name = "Error"
             notion_status = f"❌ Error: {str(e)[:50]}..."
         
+        return notion_status, database_name
+    
+    async def cmd_status(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Comando /status - Estado del sistema"""
+        if not update.message:
+            return
+            
+        notion_status, database_name = await self._get_notion_status()
+        # Recorrer la carpeta es I/O bloqueante: se hace fuera del event loop
+        images_count = await asyncio.to_thread(lambda: sum(1 for _ in self.images_path.glob('*')))
+        
         status_message = (
             f"📊 **Estado del Sistema**\n\n"
             f"🤖 **Bot**: ✅ Activo\n"
             f"📝 **Notion**: {notion_status}\n"
             f"🗃️ **Base de datos**: {database_name}\n"
             f"📁 **Carpeta**: {self.images_path.name}/\n"
-            f"📸 **Imágenes guardadas**: {len(list(self.images_path.glob('*')))}\n\n"
+            f"📸 **Imágenes guardadas**: {images_count}\n\n"
             f"🔧 **ID Base de datos**: `{self.database_id}`"
         )
         await update.message.reply_text(status_message, parse_mode='Markdown')
@@ -394,186 +701,287 @@ class TelegramNotionBot:
         if not message:
             return
         
-        # Mensaje de estado
-        status = await message.reply_text("🔄 Procesando imagen...")
+        # La misma imagen reenviada varias veces seguidas solo se procesa una
+        # vez mientras la primera siga en curso (evita páginas duplicadas)
+        image_key = self._image_source(message).file_unique_id
+        if image_key in self._inflight_images:
+            await message.reply_text("⏳ Esta imagen ya se está procesando")
+            return
+        queued = False
+        status = None
         
         try:
+            # Desde aquí el finally libera la clave aunque falle la respuesta de estado
+            self._inflight_images.add(image_key)
+            
+            # Mensaje de estado
+            status = await message.reply_text("🔄 Procesando imagen...")
+            
             # 0. EXTRAER INFORMACIÓN COMPLETA DEL MENSAJE (incluye reenvío)
-            message_data = self._extract_forward_info(message)
+            # Un único instante por mensaje: timestamp, nombre de archivo y registro
+            now = datetime.now()
+            message_data = self._extract_forward_info(message, now)
+            message_data.user_name = self._get_user_name(message)
+            message_data.record_title = f"Apuesta {message_data.user_name} - {now:%d/%m/%Y %H:%M}"
             
-            # 1. DESCARGAR IMAGEN
-            await status.edit_text("⬇️ Descargando imagen...")
-            filename = await self._download_image(message)
+            # 1. DESCARGAR IMAGEN (en paralelo con la actualización del estado)
+            filename, _ = await asyncio.gather(
+                self._download_image(message, now),
+                status.edit_text("⬇️ Descargando imagen...")
+            )
             if not filename:
                 await status.edit_text("❌ Error descargando imagen")
                 return
             
-            # 2. SUBIR A NOTION (PROCESO REAL)
+            # 2. ENCOLAR SUBIDA A NOTION (la atiende _notion_worker en segundo plano)
+            try:
+                self._notion_queue.put_nowait((message, filename, message_data, status, now))
+            except asyncio.QueueFull:
+                logger.warning("⚠️ Cola de Notion llena, se descarta: %s", filename)
+                await status.edit_text("⚠️ Hay demasiadas imágenes pendientes, reenvíala en unos minutos")
+                return
+            queued = True
+            await status.edit_text("🕒 Imagen en cola para Notion...")
+            
+        except Exception as e:
+            logger.error("❌ Error procesando imagen: %s", e)
+            if status is not None:
+                await self._edit_status_safely(status, f"❌ Error: {str(e)[:100]}...")
+        finally:
+            # Una vez en cola, es _send_to_notion quien la libera al terminar
+            if not queued:
+                self._inflight_images.discard(image_key)
+    
+    async def _notion_worker(self):
+        """Consume la cola de Notion en lotes de hasta _NOTION_BATCH_SIZE imágenes"""
+        while True:
+            batch = [await self._notion_queue.get()]
+            try:
+                while len(batch) < self._NOTION_BATCH_SIZE:
+                    batch.append(self._notion_queue.get_nowait())
+            except asyncio.QueueEmpty:
+                pass
+            
+            self._notion_active_jobs += len(batch)
+            try:
+                await asyncio.gather(*(self._send_to_notion_limited(job) for job in batch))
+            finally:
+                # Aunque el lote falle, la cola no debe quedar bloqueada
+                for _ in batch:
+                    self._notion_queue.task_done()
+    
+    async def _send_to_notion_limited(self, job: tuple):
+        """Envía un trabajo de la cola respetando el límite de concurrencia con Notion"""
+        # Un trabajo que falla no puede detener al worker ni al resto del lote
+        try:
+            async with self._notion_semaphore:
+                await self._send_to_notion(*job)
+        except Exception as e:
+            logger.error("❌ Error inesperado en el worker de Notion: %s", e)
+        finally:
+            self._notion_active_jobs -= 1
+    
+    @staticmethod
+    async def _edit_status_safely(status: Message, text: str):
+        """Edita el mensaje de estado sin propagar errores (p. ej. si el usuario lo borró)"""
+        try:
+            await status.edit_text(text)
+        except Exception as e:
+            logger.warning("⚠️ No se pudo actualizar el mensaje de estado: %s", e)
+    
+    async def _send_to_notion(self, message: Message, filename: str, message_data: MessageData, status: Message, now: datetime):
+        """Sube el archivo, crea el registro en Notion y confirma al usuario"""
+        # Token del turno: la subida pertenece a la integración que la crea,
+        # así que el registro debe usar la misma conexión
+        notion = next(self._notion_cycle)
+        
+        try:
+            # 3. SUBIR A NOTION (PROCESO REAL)
             await status.edit_text("🔄 Subiendo archivo a Notion...")
-            file_upload_id = await self._upload_file_to_notion(filename)
+            file_upload_id = await self._upload_file_to_notion(filename, notion)
             if not file_upload_id:
                 await status.edit_text("❌ Error subiendo archivo")
                 return
             
-            # 3. CREAR REGISTRO EN NOTION CON INFORMACIÓN COMPLETA
+            # 4. CREAR REGISTRO EN NOTION CON INFORMACIÓN COMPLETA
             await status.edit_text("📝 Creando registro en Notion...")
-            page_id = await self._create_notion_record(message, filename, file_upload_id, message_data)
+            page_id = await self._create_notion_record(message, filename, file_upload_id, message_data, now, notion)
             if not page_id:
                 await status.edit_text("❌ Error creando registro")
                 return
             
-            # 4. CONFIRMACIÓN FINAL CON INFORMACIÓN DE REENVÍO
-            user_name = self._get_user_name(message)
-            success_message = (
+            # 5. CONFIRMACIÓN FINAL CON INFORMACIÓN DE REENVÍO
+            forward_info = message_data.forwarding
+            success_parts = [
                 f"✅ **¡Imagen procesada exitosamente!**\n\n"
                 f"📄 **Registro creado en Notion**\n"
-                f"👤 **Usuario**: {user_name}\n"
+                f"👤 **Usuario**: {message_data.user_name}\n"
                 f"📁 **Archivo**: `{filename}`\n"
-                f"🆔 **Page ID**: `{page_id[:20]}...`"
-            )
-            
-            # Agregar información de reenvío si aplica
-            forward_response = self._format_forward_response(message_data.get("forwarding", {}))
-            if forward_response:
-                success_message += forward_response
-            
-            success_message += "\n\n🔗 Revisa tu base de datos de Notion para ver el registro completo."
-            
-            await status.edit_text(success_message, parse_mode='Markdown')
+                f"🆔 **Page ID**: `{page_id[:20]}...`",
+                # Información de reenvío (solo se formatea si aplica)
+                self._format_forward_response(forward_info) if forward_info.is_forwarded else "",
+                "\n\n🔗 Revisa tu base de datos de Notion para ver el registro completo."
+            ]
             
-            # Log con información completa
-            self._log_message_info(message_data, True, filename)
-            logger.info(f"✅ Imagen procesada: {filename} -> {page_id}")
+            # Confirmación y log con información completa en paralelo
+            await asyncio.gather(
+                status.edit_text("".join(success_parts), parse_mode='Markdown'),
+                self._log_message_info(message_data, True, filename)
+            )
+            logger.info("✅ Imagen procesada: %s -> %s", filename, page_id)
             
         except Exception as e:
-            logger.error(f"❌ Error procesando imagen: {e}")
-            await status.edit_text(f"❌ Error: {str(e)[:100]}...")
+            logger.error("❌ Error enviando imagen a Notion: %s", e)
+            await self._edit_status_safely(status, f"❌ Error: {str(e)[:100]}...")
+        finally:
+            self._inflight_images.discard(self._image_source(message).file_unique_id)
+    
+    @staticmethod
+    def _image_source(message: Message):
+        """Foto de mayor resolución o documento de imagen del mensaje"""
+        return message.photo[-1] if message.photo else message.document
+    
+    def _is_image_file(self, message: Message) -> bool:
+        """Indica si el mensaje trae una foto o un documento de imagen"""
+        # Caso dominante: foto comprimida
+        if message.photo:
+            return True
+        document = message.document
+        if document is None:
+            return False
+        
+        # El tipo MIME es más fiable y barato; la extensión queda como respaldo
+        mime_type = document.mime_type
+        if mime_type and mime_type.startswith('image/'):
+            return True
+        file_name = document.file_name
+        return bool(file_name) and os.path.splitext(file_name)[1].lower() in self._IMAGE_EXTS
     
-    async def _download_image(self, message: Message) -> Optional[str]:
+    async def _download_image(self, message: Message, now: datetime) -> Optional[str]:
         """Descarga la imagen del mensaje y devuelve el nombre del archivo"""
         try:
-            if message.photo:
-                # Obtener la foto de mayor resolución
-                file_info = await message.photo[-1].get_file()
-            elif message.document and message.document.mime_type and message.document.mime_type.startswith('image/'):
-                file_info = await message.document.get_file()
-            else:
+            if not self._is_image_file(message):
                 logger.warning("No se encontró imagen en el mensaje")
                 return None
             
-            # Generar nombre único
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
-            file_path = file_info.file_path or ""
-            extension = file_path.split('.')[-1] if '.' in file_path and file_path else 'jpg'
-            filename = f"photo_{timestamp}.{extension}"
+            file_info = await self._image_source(message).get_file()
             
-            # Descargar
-            file_path = self.images_path / filename
-            await file_info.download_to_drive(str(file_path))
+            # Generar nombre único (el message_id evita choques entre imágenes
+            # recibidas en el mismo milisegundo)
+            timestamp = now.strftime("%Y%m%d_%H%M%S_") + f"{now.microsecond // 1000:03d}"
+            extension = os.path.splitext(file_info.file_path or "")[1].lstrip('.') or 'jpg'
+            filename = f"photo_{timestamp}_{message.message_id}.{extension}"
+            
+            # Descargar (download_to_drive lanza excepción si falla, así que no
+            # hace falta comprobar el archivo en disco; el tamaño lo da Telegram)
+            await file_info.download_to_drive(self.images_path / filename)
+            logger.info("📁 Imagen descargada: %s (%s bytes)", filename, file_info.file_size)
+            return filename
             
-            if file_path.exists():
-                logger.info(f"📁 Imagen descargada: {filename}")
-                return filename
-            else:
-                logger.error("El archivo descargado no existe")
-                return None
-                
         except Exception as e:
-            logger.error(f"Error descargando imagen: {e}")
+            logger.error("Error descargando imagen: %s", e)
             return None
     
     # =============================================================================
     # SUBIDA REAL DE ARCHIVOS A NOTION (PROCESO DE 3 PASOS)
     # =============================================================================
     
-    async def _upload_file_to_notion(self, filename: str) -> Optional[str]:
+    async def _upload_file_to_notion(self, filename: str, notion: Optional[NotionConnection] = None) -> Optional[str]:
         """
         Sube el archivo REAL a Notion usando el proceso oficial de 3 pasos
         Returns: file_upload_id si es exitoso, None si falla
         """
+        http = (notion or self._notion_pool[0]).http
         file_path = self.images_path / filename
         
-        if not file_path.exists():
-            logger.error(f"Archivo no encontrado: {filename}")
+        # Lectura del archivo en un hilo: ni el open() ni el read() bloquean
+        # el event loop (httpx leería un archivo abierto de forma síncrona)
+        try:
+            file_content = await asyncio.to_thread(file_path.read_bytes)
+        except FileNotFoundError:
+            logger.error("Archivo no encontrado: %s", filename)
+            return None
+        
+        # Un archivo vacío sería rechazado por Notion tras dos peticiones
+        if not file_content:
+            logger.error("Archivo vacío, no se sube a Notion: %s", filename)
             return None
         
         try:
-            file_size = file_path.stat().st_size
-            logger.info(f"🚀 Iniciando subida REAL: {filename} ({file_size} bytes)")
+            logger.info("🚀 Iniciando subida REAL: %s (%d bytes)", filename, len(file_content))
             
-            async with aiohttp.ClientSession() as session:
-                # PASO 1: Crear File Upload Object
-                logger.info("1️⃣ Creando File Upload Object...")
-                
-                create_url = f"{self.notion_api_base}/file_uploads"
-                headers = {
-                    **self.notion_headers,
-                    "Content-Type": "application/json"
-                }
-                
-                async with session.post(create_url, headers=headers, json={}) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        raise Exception(f"Error creando file upload object: {response.status} - {error_text}")
-                    
-                    upload_data = await response.json()
-                    file_upload_id = upload_data.get("id")
-                    upload_url = upload_data.get("upload_url")
-                    
-                    if not file_upload_id or not upload_url:
-                        raise Exception("No se obtuvo ID o URL de subida")
-                    
-                    logger.info(f"✅ File Upload Object creado: {file_upload_id}")
-                
-                # PASO 2: Subir el contenido del archivo
-                logger.info("2️⃣ Subiendo contenido del archivo...")
-                
-                with open(file_path, 'rb') as f:
-                    form_data = aiohttp.FormData()
-                    form_data.add_field('file', f, filename=filename)
-                    
-                    upload_headers = {
-                        "Authorization": f"Bearer {self.notion_token}",
-                        "Notion-Version": "2022-06-28"
-                    }
-                    
-                    async with session.post(upload_url, headers=upload_headers, data=form_data) as response:
-                        if response.status != 200:
-                            error_text = await response.text()
-                            raise Exception(f"Error subiendo archivo: {response.status} - {error_text}")
-                        
-                        upload_result = await response.json()
-                        status = upload_result.get("status")
-                        
-                        if status != "uploaded":
-                            raise Exception(f"Estado del archivo no es 'uploaded': {status}")
-                        
-                        logger.info(f"✅ Archivo subido exitosamente: {filename}")
-                        return file_upload_id
+            # PASO 1: Crear File Upload Object
+            logger.info("1️⃣ Creando File Upload Object...")
+            
+            create_url = f"{self.notion_api_base}/file_uploads"
+            response = await self._notion_call(
+                lambda: http.post(create_url, json={}), self._CREATE_RETRY_STATUSES
+            )
+            if response.status_code != 200:
+                raise Exception(f"Error creando file upload object: {response.status_code} - {response.text}")
+            
+            upload_data = response.json()
+            file_upload_id = upload_data.get("id")
+            upload_url = upload_data.get("upload_url")
+            
+            if not file_upload_id or not upload_url:
+                raise Exception("No se obtuvo ID o URL de subida")
+            
+            logger.info("✅ File Upload Object creado: %s", file_upload_id)
+            
+            # PASO 2: Subir el contenido del archivo (upload_url también es
+            # api.notion.com, así que reutiliza la misma conexión HTTP/2)
+            logger.info("2️⃣ Subiendo contenido del archivo...")
+            
+            response = await self._notion_call(
+                lambda: http.post(upload_url, files={'file': (filename, file_content)})
+            )
+            
+            # Un 200 en la subida de una sola parte implica estado 'uploaded':
+            # solo se lee el cuerpo cuando hay que reportar un error
+            if response.status_code != 200:
+                raise Exception(f"Error subiendo archivo: {response.status_code} - {response.text}")
+            
+            logger.info("✅ Archivo subido exitosamente: %s", filename)
+            return file_upload_id
                         
         except Exception as e:
-            logger.error(f"❌ Error en subida real: {e}")
+            logger.error("❌ Error en subida real: %s", e)
             return None
     
     # =============================================================================
     # CREACIÓN DE REGISTROS EN NOTION
     # =============================================================================
     
-    async def _create_notion_record(self, message: Message, filename: str, file_upload_id: str, message_data: Optional[dict] = None) -> Optional[str]:
+    @classmethod
+    def _rich_text(cls, content: str) -> list:
+        """Trocea el texto en elementos rich_text de como máximo _NOTION_TEXT_LIMIT caracteres"""
+        limit = cls._NOTION_TEXT_LIMIT
+        return [
+            {"text": {"content": content[i:i + limit]}}
+            for i in range(0, len(content), limit)
+        ][:100] or [{"text": {"content": ""}}]
+    
+    async def _create_notion_record(self, message: Message, filename: str, file_upload_id: str, message_data: Optional[MessageData] = None, now: Optional[datetime] = None, notion: Optional[NotionConnection] = None) -> Optional[str]:
         """
         PASO 3: Crear registro en Notion con archivo real adjunto y información completa de reenvío
         """
         try:
             logger.info("3️⃣ Creando registro con archivo real adjunto...")
             
-            # Generar título
-            user_name = self._get_user_name(message)
-            title = f"Apuesta {user_name} - {datetime.now().strftime('%d/%m/%Y %H:%M')}"
+            # Generar título (precalculado en handle_image cuando viene del worker)
+            now = now or datetime.now()
+            if message_data and message_data.record_title:
+                user_name = message_data.user_name
+                title = message_data.record_title
+            else:
+                user_name = self._get_user_name(message)
+                title = f"Apuesta {user_name} - {now:%d/%m/%Y %H:%M}"
             
             # Extraer información adicional
             text_content = message.text or message.caption or ""
-            forward_info = message_data.get("forwarding", {}) if message_data else {}
-            is_forwarded = forward_info.get("is_forwarded", False)
+            forward_info = message_data.forwarding if message_data else _NOT_FORWARDED
+            is_forwarded = forward_info.is_forwarded
             
             # Información adicional para Mercado / Selección
             additional_info = []
@@ -584,48 +992,44 @@ class TelegramNotionBot:
             if is_forwarded:
                 additional_info.append("🔄 MENSAJE REENVIADO")
                 
-                origin = forward_info.get("origin_info", {})
-                unique_id = forward_info.get("unique_identifier")
+                origin = forward_info.origin_info
+                unique_id = forward_info.unique_identifier
+                user_id = origin.origin_sender_user_id
+                name = origin.origin_sender_name
+                chat_id = origin.origin_chat_id
+                origin_date = origin.origin_date
                 
                 # Información del origen
-                if origin.get("origin_sender_user_id"):
-                    user_id = origin.get("origin_sender_user_id")
-                    username = origin.get("origin_sender_username", "")
-                    name = origin.get("origin_sender_name", "")
+                if user_id:
+                    username = origin.origin_sender_username
                     additional_info.append(f"👤 Origen: ID {user_id}")
                     if username:
                         additional_info.append(f"   @{username}")
                     if name:
                         additional_info.append(f"   {name}")
                         
-                elif origin.get("origin_sender_name"):
-                    sender_name = origin.get("origin_sender_name")
-                    if sender_name:
-                        additional_info.append(f"👤 Usuario privado: {sender_name}")
+                elif name:
+                    additional_info.append(f"👤 Usuario privado: {name}")
                     
-                elif origin.get("origin_chat_id"):
-                    chat_id = origin.get("origin_chat_id")
-                    title_chat = origin.get("origin_chat_title", "")
-                    username_chat = origin.get("origin_chat_username", "")
-                    if chat_id:
-                        additional_info.append(f"📢 Canal/Grupo: ID {chat_id}")
-                        if username_chat:
-                            additional_info.append(f"   @{username_chat}")
-                        elif title_chat:
-                            additional_info.append(f"   {title_chat}")
+                elif chat_id:
+                    title_chat = origin.origin_chat_title
+                    username_chat = origin.origin_chat_username
+                    additional_info.append(f"📢 Canal/Grupo: ID {chat_id}")
+                    if username_chat:
+                        additional_info.append(f"   @{username_chat}")
+                    elif title_chat:
+                        additional_info.append(f"   {title_chat}")
                 
                 # Fecha original y ID único
-                if origin.get("origin_date"):
-                    origin_date = origin.get("origin_date")
-                    if origin_date and len(origin_date) >= 10:
-                        additional_info.append(f"📅 Fecha original: {origin_date[:10]}")
+                if origin_date:
+                    additional_info.append(f"📅 Fecha original: {origin_date:%Y-%m-%d}")
                 if unique_id:
                     additional_info.append(f"🆔 ID único: {unique_id}")
                 
                 # Información del que reenvía
-                sender = message_data.get("sender", {}) if message_data else {}
+                sender = message_data.sender if message_data else None
                 if sender:
-                    additional_info.append(f"📤 Reenviado por: {sender.get('full_name', 'Usuario')} (ID: {sender.get('user_id', 'N/A')})")
+                    additional_info.append(f"📤 Reenviado por: {sender.full_name or 'Usuario'} (ID: {sender.user_id})")
             else:
                 additional_info.append(f"📤 Usuario: {user_name}")
             
@@ -640,26 +1044,17 @@ class TelegramNotionBot:
                     "title": [
                         {
                             "text": {
-                                "content": title
+                                "content": title[:self._NOTION_TEXT_LIMIT]
                             }
                         }
                     ]
                 },
                 "Fecha": {
                     "date": {
-                        "start": datetime.now().isoformat()[:10]
-                    }
-                },
-                "Resultado": {
-                    "select": {
-                        "name": "Pendiente"
-                    }
-                },
-                "Tipo de apuesta": {
-                    "select": {
-                        "name": "Simple"
+                        "start": now.date().isoformat()
                     }
                 },
+                **self._PROPS_SKELETON,
                 # ARCHIVO REAL usando file_upload_id
                 "Captura / Comprobante": {
                     "files": [
@@ -674,82 +1069,83 @@ class TelegramNotionBot:
                 },
                 # Información adicional (incluyendo información de reenvío)
                 "Mercado / Selección": {
-                    "rich_text": [
-                        {
-                            "text": {
-                                "content": market_info
-                            }
-                        }
-                    ]
+                    "rich_text": self._rich_text(market_info)
                 }
             }
             
-            # Crear el registro
-            if self.notion_client:
-                response = self.notion_client.pages.create(
-                    parent={"database_id": self.database_id},
-                    properties=properties
-                )
-                
-                if isinstance(response, dict) and "id" in response:
-                    page_id = response["id"]
-                    logger.info(f"✅ Registro creado con archivo REAL: {page_id}")
-                    return page_id
-                else:
-                    logger.error("Respuesta inesperada de Notion API")
-                    return None
-            else:
-                logger.error("Cliente Notion no disponible")
-                return None
+            # Crear el registro (con el mismo token que subió el archivo)
+            client = (notion or self._notion_pool[0]).client
+            response: dict = await self._notion_call(lambda: client.pages.create(
+                parent={"database_id": self.database_id},
+                properties=properties
+            ), self._CREATE_RETRY_STATUSES)
+            
+            page_id = response["id"]
+            logger.info("✅ Registro creado con archivo REAL: %s", page_id)
+            return page_id
                 
+        except KeyError:
+            logger.error("Respuesta inesperada de Notion API")
+            return None
+        except HTTPResponseError as e:
+            # Un error de validación suele indicar que el esquema cambió:
+            # se descarta el esquema cacheado para que se vuelva a leer
+            if e.code == APIErrorCode.ValidationError:
+                self._database_info = None
+            logger.error("❌ Error creando registro: %s", e)
+            return None
         except Exception as e:
-            logger.error(f"❌ Error creando registro: {e}")
+            logger.error("❌ Error creando registro: %s", e)
             return None
     
     # =============================================================================
     # UTILIDADES
     # =============================================================================
     
-    def _log_message_info(self, message_data: dict, has_image: bool, filename: Optional[str] = None):
+    async def _log_message_info(self, message_data: MessageData, has_image: bool, filename: Optional[str] = None):
         """Registra información completa del mensaje procesado"""
         try:
-            print("\n" + "="*80)
-            print("🖼️ IMAGEN PROCESADA" if has_image else "💬 MENSAJE PROCESADO")
-            print("="*80)
-            
             # Log resumido
-            sender = message_data.get("sender", {})
-            sender_name = sender.get("full_name", "Usuario")
-            sender_id = sender.get("user_id", "N/A")
+            sender = message_data.sender
+            sender_name = sender.full_name if sender else "Usuario"
+            sender_id = sender.user_id if sender else "N/A"
             
-            forward_info = message_data.get("forwarding", {})
+            forward_info = message_data.forwarding
             log_msg = f"{'Imagen' if has_image else 'Mensaje'} procesado de {sender_name} ({sender_id})"
             
             if filename:
                 log_msg += f" - Archivo: {filename}"
             
-            if forward_info.get("is_forwarded"):
-                origin = forward_info.get("origin_info", {})
-                if origin.get("origin_sender_user_id"):
-                    origin_name = origin.get("origin_sender_username") or origin.get("origin_sender_name")
-                    origin_id = origin.get("origin_sender_user_id")
-                    log_msg += f" - REENVIADO DE: {origin_name} (ID: {origin_id})"
-                elif origin.get("origin_sender_name"):
-                    sender_name = origin.get("origin_sender_name")
-                    log_msg += f" - REENVIADO DE: {sender_name} (privado)"
-                elif origin.get("origin_chat_id"):
-                    chat_name = origin.get("origin_chat_username") or origin.get("origin_chat_title")
-                    chat_id = origin.get("origin_chat_id")
+            if forward_info.is_forwarded:
+                origin = forward_info.origin_info
+                origin_id = origin.origin_sender_user_id
+                origin_name = origin.origin_sender_name
+                chat_id = origin.origin_chat_id
+                if origin_id:
+                    username = origin.origin_sender_username
+                    log_msg += f" - REENVIADO DE: {username or origin_name} (ID: {origin_id})"
+                elif origin_name:
+                    log_msg += f" - REENVIADO DE: {origin_name} (privado)"
+                elif chat_id:
+                    chat_name = origin.origin_chat_username or origin.origin_chat_title
                     log_msg += f" - REENVIADO DE CANAL: {chat_name} (ID: {chat_id})"
             
-            # Log detallado en JSON (para debugging)
-            print(json.dumps(message_data, indent=2, ensure_ascii=False, default=str))
-            print("="*80 + "\n")
+            # Log detallado en JSON (para debugging, solo con LOG_LEVEL=DEBUG):
+            # la serialización solo se paga si DEBUG está activo y se hace fuera
+            # del event loop
+            if logger.isEnabledFor(logging.DEBUG):
+                await asyncio.to_thread(self._write_debug_dump, message_data, has_image)
             
             logger.info(log_msg)
             
         except Exception as e:
-            logger.error(f"Error en logging: {e}")
+            logger.error("Error en logging: %s", e)
+    
+    def _write_debug_dump(self, message_data: MessageData, has_image: bool):
+        """Registra en DEBUG el JSON completo del mensaje procesado (se ejecuta en un hilo)"""
+        # Un único registro para que los volcados de hilos concurrentes no se mezclen
+        title = "🖼️ IMAGEN PROCESADA" if has_image else "💬 MENSAJE PROCESADO"
+        logger.debug("\n%s\n%s\n%s\n%s\n%s", _BANNER, title, _BANNER, _dump_json(message_data), _BANNER)
     
     def _get_user_name(self, message: Message) -> str:
         """Obtiene el nombre del usuario de manera segura"""
@@ -757,14 +1153,10 @@ class TelegramNotionBot:
             return "Usuario desconocido"
         
         user = message.from_user
-        parts = []
-        if user.first_name:
-            parts.append(user.first_name)
-        if user.last_name:
-            parts.append(user.last_name)
-        
-        if parts:
-            return " ".join(parts)
+        full_name = self._full_name(user)
+        
+        if full_name:
+            return full_name
         elif user.username:
             return f"@{user.username}"
         else:
@@ -779,36 +1171,73 @@ class TelegramNotionBot:
         try:
             # Extraer información del mensaje (incluye reenvío)
             message_data = self._extract_forward_info(message)
-            forward_info = message_data.get("forwarding", {})
+            forward_info = message_data.forwarding
             
             # Respuesta base
-            help_text = "📸 **Solo proceso imágenes por ahora**\n\n"
+            help_parts = ["📸 **Solo proceso imágenes por ahora**\n\n"]
             
             # Si es un mensaje reenviado, mostrar información
-            if forward_info.get("is_forwarded"):
+            if forward_info.is_forwarded:
                 forward_response = self._format_forward_response(forward_info)
-                help_text += f"**Mensaje analizado:**{forward_response}\n\n"
+                help_parts.append(f"**Mensaje analizado:**{forward_response}\n\n")
             
-            help_text += (
+            help_parts.append(
                 "Para usar el bot:\n"
                 "1️⃣ Envía una imagen (JPG, PNG, etc.)\n"
                 "2️⃣ El bot la procesará automáticamente\n\n"
                 "💡 Usa `/help` para más información"
             )
             
-            await message.reply_text(help_text, parse_mode='Markdown')
-            
-            # Log de la información extraída
-            self._log_message_info(message_data, False)
+            # Respuesta y log de la información extraída en paralelo
+            await asyncio.gather(
+                message.reply_text("".join(help_parts), parse_mode='Markdown'),
+                self._log_message_info(message_data, False)
+            )
             
         except Exception as e:
-            logger.error(f"Error procesando mensaje: {e}")
+            logger.error("Error procesando mensaje: %s", e)
             await message.reply_text("📸 **Solo proceso imágenes por ahora**\n\n💡 Usa `/help` para más información")
     
     # =============================================================================
     # EJECUCIÓN DEL BOT
     # =============================================================================
     
+    async def _post_init(self, application: Application):
+        """Arranca el worker de Notion y precalienta DNS/TLS para evitar el arranque en frío"""
+        self._notion_queue = asyncio.Queue(maxsize=self._NOTION_QUEUE_SIZE)
+        self._notion_semaphore = asyncio.Semaphore(self._NOTION_CONCURRENCY * len(self._notion_pool))
+        self._notion_worker_task = asyncio.create_task(self._notion_worker())
+        
+        results = await asyncio.gather(
+            *(notion.http.get(f"{self.notion_api_base}/users/me") for notion in self._notion_pool),
+            return_exceptions=True
+        )
+        # users/me también valida cada token: un 401 indica un token revocado o incorrecto
+        healthy = True
+        for index, result in enumerate(results, start=1):
+            if isinstance(result, Exception):
+                healthy = False
+                logger.warning("⚠️ No se pudo precalentar la conexión con Notion (token %d): %s", index, result)
+            elif result.status_code != 200:
+                healthy = False
+                logger.warning("⚠️ Notion rechazó el token %d al arrancar: HTTP %s", index, result.status_code)
+        if healthy:
+            logger.info("🔥 Conexión con Notion precalentada")
+    
+    async def _post_shutdown(self, application: Application):
+        """Detiene el worker de Notion y cierra las conexiones HTTP"""
+        # Pendientes: las que siguen en cola más las del lote en curso, que se interrumpe
+        pending = self._notion_active_jobs + (self._notion_queue.qsize() if self._notion_queue else 0)
+        if self._notion_worker_task:
+            self._notion_worker_task.cancel()
+            # Esperar a que el lote en curso se cancele antes de cerrar sus clientes HTTP
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._notion_worker_task
+        if pending:
+            logger.warning("⚠️ %d imagen(es) sin enviar a Notion (quedan en %s)", pending, self.images_path)
+        await asyncio.gather(*(notion.http.aclose() for notion in self._notion_pool))
+        logger.info("🔌 Conexión con Notion cerrada")
+    
     def run(self):
         """Inicia el bot y lo mantiene funcionando"""
         logger.info("🚀 Iniciando aplicación de Telegram...")
@@ -817,7 +1246,22 @@ class TelegramNotionBot:
         if not self.telegram_token:
             raise ValueError("Token de Telegram no disponible")
             
-        application = Application.builder().token(self.telegram_token).build()
+        builder = (
+            Application.builder()
+            .token(self.telegram_token)
+            .concurrent_updates(True)
+            .post_init(self._post_init)
+            .post_shutdown(self._post_shutdown)
+        )
+        
+        # Limitador de peticiones a Telegram (opcional): en ráfagas, p. ej. un
+        # álbum reenviado, espacia las respuestas/ediciones y reintenta los 429
+        try:
+            builder.rate_limiter(AIORateLimiter(max_retries=3))
+        except RuntimeError:
+            logger.info("ℹ️ AIORateLimiter no disponible (instala python-telegram-bot[rate-limiter])")
+        
+        application = builder.build()
         
         # Agregar handlers
         application.add_handler(CommandHandler("start", self.cmd_start))
@@ -840,7 +1284,7 @@ class TelegramNotionBot:
         print("\n" + "="*60)
         print("🤖 BOT DE TELEGRAM CON NOTION - INICIADO")
         print("="*60)
-        print(f"📁 Carpeta de imágenes: {self.images_path.absolute()}")
+        print(f"📁 Carpeta de imágenes: {self.images_path}")
         print(f"🗃️ Base de datos Notion: {self.database_id}")
         print("📸 Envía imágenes al bot para procesarlas")
         print("⏹️  Presiona Ctrl+C para detener")
@@ -852,19 +1296,24 @@ class TelegramNotionBot:
         except KeyboardInterrupt:
             logger.info("🛑 Bot detenido por el usuario")
         except Exception as e:
-            logger.error(f"❌ Error ejecutando bot: {e}")
+            logger.error("❌ Error ejecutando bot: %s", e)
             raise
 
 
 def main():
     """Función principal del script"""
+    # Event loop basado en libuv si está instalado
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        logger.info("⚡ Usando uvloop como event loop")
+    
     try:
         print("🤖 Inicializando Bot de Telegram con Notion...")
         bot = TelegramNotionBot()
         bot.run()
         
     except ValueError as e:
-        logger.error(f"❌ Error de configuración: {e}")
+        logger.error("❌ Error de configuración: %s", e)
         print(f"\n❌ {e}")
         print("\n💡 Configuración necesaria:")
         print("1. Crea un archivo .env con:")
@@ -877,7 +1326,7 @@ def main():
         print("\n👋 ¡Bot detenido!")
         
     except Exception as e:
-        logger.error(f"❌ Error fatal: {e}")
+        logger.error("❌ Error fatal: %s", e)
         print(f"\n❌ Error: {e}")
 
 
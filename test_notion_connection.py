@@ -7,12 +7,12 @@ import os
 import asyncio
 from datetime import datetime
 from dotenv import load_dotenv
-from notion_client import Client
+from notion_client import AsyncClient
 
 # Cargar variables de entorno
 load_dotenv()
 
-def test_notion_connection():
+async def _check_notion_connection():
     """Prueba la conexión con Notion usando las propiedades correctas."""
     
     # Verificar variables de entorno
@@ -30,46 +30,45 @@ def test_notion_connection():
     try:
         # Conectar con Notion
         print("\n🔌 Conectando con Notion...")
-        notion = Client(auth=notion_token)
-        
-        # Verificar acceso a la base de datos
-        print("📊 Verificando base de datos...")
-        database = notion.databases.retrieve(database_id)
-        print(f"✅ Base de datos encontrada: {database['title'][0]['plain_text']}")
-        
-        # Crear página de prueba
-        print("\n📝 Creando página de prueba...")
-        properties = {
-            "Evento / Selección": {
-                "title": [{"text": {"content": f"Prueba de conexión - {datetime.now().strftime('%H:%M:%S')}"}}]
-            },
-            "Fecha": {
-                "date": {"start": datetime.now().isoformat()}
-            },
-            "Resultado": {
-                "select": {"name": "Pendiente"}
-            },
-            "Tipo de apuesta": {
-                "select": {"name": "Simple"}
-            },
-            "Mercado / Selección": {
-                "rich_text": [{"text": {"content": "Esta es una prueba de conexión desde el bot"}}]
+        async with AsyncClient(auth=notion_token) as notion:
+            now = datetime.now()
+            properties = {
+                "Evento / Selección": {
+                    "title": [{"text": {"content": f"Prueba de conexión - {now:%H:%M:%S}"}}]
+                },
+                "Fecha": {
+                    "date": {"start": now.isoformat()}
+                },
+                "Resultado": {
+                    "select": {"name": "Pendiente"}
+                },
+                "Tipo de apuesta": {
+                    "select": {"name": "Simple"}
+                },
+                "Mercado / Selección": {
+                    "rich_text": [{"text": {"content": "Esta es una prueba de conexión desde el bot"}}]
+                }
             }
-        }
-        
-        page = notion.pages.create(
-            parent={"database_id": database_id},
-            properties=properties
-        )
-        
-        page_id = page['id']
-        print(f"✅ Página creada exitosamente: {page_id}")
-        
-        # Leer la página creada
-        print("📖 Verificando página creada...")
-        created_page = notion.pages.retrieve(page_id)
-        title = created_page['properties']['Evento / Selección']['title'][0]['plain_text']
-        print(f"✅ Página verificada: '{title}'")
+            
+            # Verificar la base de datos antes de crear nada: si el token no
+            # puede leerla, no se deja una página de prueba a medias
+            print("📊 Verificando base de datos...")
+            database = await notion.databases.retrieve(database_id)
+            print(f"✅ Base de datos encontrada: {database['title'][0]['plain_text']}")
+            
+            print("📝 Creando página de prueba...")
+            page = await notion.pages.create(
+                parent={"database_id": database_id},
+                properties=properties
+            )
+            page_id = page['id']
+            print(f"✅ Página creada exitosamente: {page_id}")
+            
+            # Leer la página creada
+            print("📖 Verificando página creada...")
+            created_page = await notion.pages.retrieve(page_id)
+            title = created_page['properties']['Evento / Selección']['title'][0]['plain_text']
+            print(f"✅ Página verificada: '{title}'")
         
         print("\n🎉 ¡Conexión con Notion exitosa!")
         return True
@@ -78,6 +77,10 @@ def test_notion_connection():
         print(f"\n❌ Error: {e}")
         return False
 
+def test_notion_connection():
+    """Punto de entrada síncrono (pytest y ejecución directa)"""
+    return asyncio.run(_check_notion_connection())
+
 if __name__ == "__main__":
     print("🧪 Test de Conexión con Notion")
     print("=" * 40)
@@ -5,13 +5,28 @@ Prueba la implementación completa según la documentación de Notion
 """
 
 import os
+import sys
+import json
 import logging
+import math
+import random
 import asyncio
 import aiohttp
 from pathlib import Path
-from datetime import datetime
+from contextlib import ExitStack
+from typing import Callable, List, Optional
+from datetime import date
 from dotenv import load_dotenv
-from notion_client import Client
+
+try:
+    import orjson
+except ImportError:  # Opcional: se usa el json de la librería estándar
+    orjson = None
+
+try:
+    import uvloop
+except ImportError:  # Opcional: no disponible en Windows
+    uvloop = None
 
 # Cargar variables de entorno
 load_dotenv()
@@ -21,9 +36,44 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def _json_loads(body: bytes):
+    """Decodifica el cuerpo JSON ya leído (orjson si está disponible)"""
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
 class NotionRealUploadTester:
     """Tester para subida real de archivos a Notion"""
     
+    # Reintentos ante respuestas transitorias de Notion en las subidas
+    _MAX_ATTEMPTS = 3
+    _RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+    
+    # Notion admite hasta 20 MB en una sola petición; por encima se sube por partes
+    _SINGLE_PART_LIMIT = 20 * 1024 * 1024
+    _PART_SIZE = 5 * 1024 * 1024
+    
+    # Propiedades estáticas de cada registro (no se modifican, se comparten)
+    _PROPS_SKELETON = {
+        # Estado inicial
+        "Resultado": {
+            "select": {
+                "name": "Pendiente"
+            }
+        }
+    }
+    
+    # Cuerpo del PASO 1 en la subida simple: {} ya serializado con su Content-Type
+    # (Authorization y Notion-Version los añade la sesión)
+    _EMPTY_JSON_BODY = {'data': b'{}', 'headers': {'Content-Type': 'application/json'}}
+    
+    # Bytes a partir de los cuales una respuesta JSON se decodifica fuera del event loop
+    _THREAD_PARSE_THRESHOLD = 32_000
+    
+    # Extensiones aceptadas como archivo de prueba
+    _IMAGE_EXTS = frozenset({'.jpg', '.jpeg', '.png', '.gif'})
+    
     def __init__(self):
         """Inicializa el tester"""
         self.notion_token = os.getenv('NOTION_TOKEN')
@@ -32,9 +82,6 @@ class NotionRealUploadTester:
         if not self.notion_token:
             raise ValueError("Falta NOTION_TOKEN en el archivo .env")
         
-        # Crear cliente de Notion
-        self.notion_client = Client(auth=self.notion_token)
-        
         # Configuración para la API
         self.notion_api_base = "https://api.notion.com/v1"
         self.notion_headers = {
@@ -42,179 +89,325 @@ class NotionRealUploadTester:
             "Notion-Version": "2022-06-28"
         }
         
+        # Sesión HTTP compartida por los 3 pasos (se crea en _get_session)
+        self._session: Optional[aiohttp.ClientSession] = None
+        
+        # Peticiones simultáneas a Notion al subir varios archivos
+        self._sem = asyncio.Semaphore(3)
+        
         logger.info("Cliente de Notion inicializado para test de subida real")
     
-    async def upload_file_real(self, file_path: Path) -> str:
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Sesión aiohttp única: reutiliza la conexión TLS entre peticiones"""
+        if self._session is None:
+            session_options = {}
+            if orjson is not None:
+                # Serializa los cuerpos json= (propiedades del registro) con orjson
+                session_options['json_serialize'] = lambda obj: orjson.dumps(obj).decode()
+            self._session = aiohttp.ClientSession(
+                headers=self.notion_headers,
+                # DNS de api.notion.com cacheado 5 minutos (por defecto son 10 s)
+                connector=aiohttp.TCPConnector(
+                    limit=10, limit_per_host=10, keepalive_timeout=75,
+                    use_dns_cache=True, ttl_dns_cache=300
+                ),
+                **session_options
+            )
+        return self._session
+    
+    async def close(self):
+        """Cierra la sesión HTTP compartida"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+    
+    async def _post_with_retry(self, url: str, error_message: str, make_data: Optional[Callable] = None, **kwargs) -> dict:
         """
-        Implementa el proceso completo de 3 pasos para subir archivo a Notion
+        POST con reintentos y backoff exponencial ante errores transitorios
+        (408/429/5xx o fallo de conexión); cualquier otro error se lanza al momento
         
-        Returns:
-            file_upload_id si es exitoso, None si falla
+        make_data construye de nuevo el cuerpo en cada intento (un FormData no se reutiliza)
         """
-        try:
-            if not file_path.exists():
-                raise FileNotFoundError(f"Archivo no encontrado: {file_path}")
+        session = await self._get_session()
+        
+        for attempt in range(self._MAX_ATTEMPTS):
+            if make_data:
+                kwargs['data'] = make_data()
+            try:
+                async with session.post(url, **kwargs) as response:
+                    body = await response.read()
+                    if response.status == 200:
+                        return _json_loads(body)
+                    status = response.status
+                    error_text = body.decode('utf-8', 'replace')
+            except (aiohttp.ClientConnectorError, aiohttp.ServerDisconnectedError) as e:
+                status, error_text = None, str(e)
             
-            file_size = file_path.stat().st_size
-            logger.info(f"🚀 Iniciando subida REAL: {file_path.name} ({file_size} bytes)")
+            if (status is not None and status not in self._RETRY_STATUSES) or attempt == self._MAX_ATTEMPTS - 1:
+                raise Exception(f"{error_message}: {status} - {error_text}")
             
-            async with aiohttp.ClientSession() as session:
-                # PASO 1: Crear File Upload Object
-                logger.info("1️⃣ Creando File Upload Object...")
-                
-                create_url = f"{self.notion_api_base}/file_uploads"
-                headers = {
-                    **self.notion_headers,
-                    "Content-Type": "application/json"
-                }
-                
-                async with session.post(create_url, headers=headers, json={}) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        raise Exception(f"Error creando file upload object: {response.status} - {error_text}")
-                    
-                    upload_data = await response.json()
-                    file_upload_id = upload_data.get("id")
-                    upload_url = upload_data.get("upload_url")
-                    expiry_time = upload_data.get("expiry_time")
-                    
-                    if not file_upload_id or not upload_url:
-                        raise Exception("No se obtuvo ID o URL de subida")
-                    
-                    logger.info(f"✅ File Upload Object creado:")
-                    logger.info(f"   ID: {file_upload_id}")
-                    logger.info(f"   Upload URL: {upload_url}")
-                    logger.info(f"   Expira: {expiry_time}")
-                
-                # PASO 2: Subir el contenido del archivo
-                logger.info("2️⃣ Subiendo contenido del archivo...")
-                
-                with open(file_path, 'rb') as f:
-                    form_data = aiohttp.FormData()
-                    form_data.add_field('file', f, filename=file_path.name)
-                    
-                    # Headers para la subida (sin Content-Type explícito)
-                    upload_headers = {
-                        "Authorization": f"Bearer {self.notion_token}",
-                        "Notion-Version": "2022-06-28"
-                    }
+            delay = min(2 ** attempt + random.random(), 8)
+            logger.warning("⏳ %s (%s), reintento %d/%d en %.1fs",
+                           error_message, status, attempt + 1, self._MAX_ATTEMPTS - 1, delay)
+            await asyncio.sleep(delay)
+    
+    def _upload_params(self, file_path: Path, file_size: int) -> dict:
+        """Cuerpo del PASO 1: vacío para una subida simple, multi_part para archivos grandes"""
+        if file_size <= self._SINGLE_PART_LIMIT:
+            return {}
+        return {
+            "mode": "multi_part",
+            "number_of_parts": math.ceil(file_size / self._PART_SIZE),
+            "filename": file_path.name
+        }
+    
+    async def _create_upload_obj(self, params: Optional[dict] = None) -> dict:
+        """PASO 1: Crea un File Upload Object y devuelve su id y upload_url"""
+        # La sesión ya lleva Authorization y Notion-Version; la subida simple
+        # envía un {} ya serializado, sin pasar por el codificador JSON
+        create_url = f"{self.notion_api_base}/file_uploads"
+        body = {'json': params} if params else self._EMPTY_JSON_BODY
+        async with self._sem:
+            upload_data = await self._post_with_retry(
+                create_url, "Error creando file upload object", **body
+            )
+        
+        file_upload_id = upload_data.get("id")
+        upload_url = upload_data.get("upload_url")
+        
+        if not file_upload_id or not upload_url:
+            raise Exception("No se obtuvo ID o URL de subida")
+        
+        logger.info("✅ File Upload Object creado: id=%s expira=%s", file_upload_id, upload_data.get('expiry_time'))
+        logger.debug("   Upload URL: %s", upload_url)
+        return upload_data
+    
+    @staticmethod
+    def _read_part(file_path: Path, offset: int, size: int) -> bytes:
+        """Lee un tramo del archivo (se ejecuta en un hilo)"""
+        with open(file_path, 'rb') as f:
+            f.seek(offset)
+            return f.read(size)
+    
+    async def _send_part(self, file_path: Path, upload_url: str, part_number: int) -> None:
+        """Sube una parte de _PART_SIZE bytes; un reintento solo repite esa parte"""
+        async with self._sem:
+            chunk = await asyncio.to_thread(
+                self._read_part, file_path, (part_number - 1) * self._PART_SIZE, self._PART_SIZE
+            )
+            
+            def make_form() -> aiohttp.FormData:
+                form_data = aiohttp.FormData()
+                form_data.add_field('file', chunk, filename=file_path.name)
+                form_data.add_field('part_number', str(part_number))
+                return form_data
+            
+            await self._post_with_retry(upload_url, f"Error subiendo parte {part_number}", make_data=make_form)
+        logger.debug("   Parte %d subida", part_number)
+    
+    async def _send_parts(self, file_path: Path, upload_data: dict, file_size: int) -> dict:
+        """Sube un archivo grande por partes en paralelo y completa la subida"""
+        number_of_parts = math.ceil(file_size / self._PART_SIZE)
+        logger.info("📦 Subida por partes: %d partes de hasta %d bytes", number_of_parts, self._PART_SIZE)
+        
+        await asyncio.gather(*(
+            self._send_part(file_path, upload_data["upload_url"], part_number)
+            for part_number in range(1, number_of_parts + 1)
+        ))
+        
+        complete_url = f"{self.notion_api_base}/file_uploads/{upload_data['id']}/complete"
+        async with self._sem:
+            return await self._post_with_retry(complete_url, "Error completando subida por partes", json={})
+    
+    async def _send_bytes(self, file_path: Path, upload_data: dict, file_size: int) -> str:
+        """PASO 2: Sube el contenido del archivo al File Upload Object"""
+        if file_size > self._SINGLE_PART_LIMIT:
+            upload_result = await self._send_parts(file_path, upload_data, file_size)
+        else:
+            async with self._sem:
+                # aiohttp cierra el archivo al enviarlo: cada intento abre uno nuevo
+                with ExitStack() as files:
+                    def make_form() -> aiohttp.FormData:
+                        form_data = aiohttp.FormData()
+                        form_data.add_field('file', files.enter_context(open(file_path, 'rb')), filename=file_path.name)
+                        return form_data
                     
-                    async with session.post(upload_url, headers=upload_headers, data=form_data) as response:
-                        if response.status != 200:
-                            error_text = await response.text()
-                            raise Exception(f"Error subiendo archivo: {response.status} - {error_text}")
-                        
-                        upload_result = await response.json()
-                        status = upload_result.get("status")
-                        filename = upload_result.get("filename")
-                        content_type = upload_result.get("content_type")
-                        content_length = upload_result.get("content_length")
-                        
-                        if status != "uploaded":
-                            raise Exception(f"Estado del archivo no es 'uploaded': {status}")
-                        
-                        logger.info(f"✅ Archivo subido exitosamente:")
-                        logger.info(f"   Nombre: {filename}")
-                        logger.info(f"   Tipo: {content_type}")
-                        logger.info(f"   Tamaño: {content_length} bytes")
-                        logger.info(f"   Estado: {status}")
-                        
-                        return file_upload_id
-                        
-        except Exception as e:
-            logger.error(f"❌ Error en subida real: {e}")
-            raise
+                    upload_result = await self._post_with_retry(
+                        upload_data["upload_url"], "Error subiendo archivo", make_data=make_form
+                    )
+        
+        status = upload_result.get("status")
+        if status != "uploaded":
+            raise Exception(f"Estado del archivo no es 'uploaded': {status}")
+        
+        logger.info("✅ Archivo subido: %s (%s, %s bytes)", upload_result.get('filename'),
+                    upload_result.get('content_type'), upload_result.get('content_length'))
+        
+        return upload_data["id"]
+    
+    async def upload_files_real(self, paths: List[Path]) -> List[str]:
+        """
+        Sube varios archivos con el proceso de 3 pasos, solapando las peticiones
+        (como máximo 3 simultáneas, dentro del límite de Notion)
+        
+        Returns:
+            file_upload_id de cada archivo, en el mismo orden que paths
+            (los errores se propagan: los registra el llamador)
+        """
+        # Un único stat por archivo: da el tamaño y lanza FileNotFoundError si falta
+        sizes = [os.stat(file_path).st_size for file_path in paths]
+        for file_path, file_size in zip(paths, sizes):
+            logger.info("🚀 Iniciando subida REAL: %s (%d bytes)", file_path.name, file_size)
+        
+        # PASO 1: Crear los File Upload Objects
+        logger.info("1️⃣ Creando File Upload Object...")
+        uploads = await asyncio.gather(*(
+            self._create_upload_obj(self._upload_params(file_path, file_size))
+            for file_path, file_size in zip(paths, sizes)
+        ))
+        
+        # PASO 2: Subir el contenido de los archivos
+        logger.info("2️⃣ Subiendo contenido del archivo...")
+        return await asyncio.gather(*(
+            self._send_bytes(file_path, upload_data, file_size)
+            for file_path, upload_data, file_size in zip(paths, uploads, sizes)
+        ))
+    
+    async def upload_file_real(self, file_path: Path) -> str:
+        """
+        Implementa el proceso completo de 3 pasos para subir archivo a Notion
+        
+        Returns:
+            file_upload_id si es exitoso
+        """
+        (file_upload_id,) = await self.upload_files_real([file_path])
+        return file_upload_id
     
-    def create_record_with_real_file(self, title: str, file_upload_id: str, filename: str) -> str:
+    async def create_record_with_real_file(self, title: str, file_upload_id: str, filename: str, today_iso: Optional[str] = None) -> str:
         """
         PASO 3: Crear registro con archivo real adjunto
+        Los errores se propagan: los registra el llamador (una sola vez)
         """
-        try:
-            logger.info("3️⃣ Creando registro con archivo real adjunto...")
-            
-            properties = {
-                # Campo título - origin_chat_title
-                "Evento / Selección": {
-                    "title": [
-                        {
-                            "text": {
-                                "content": title
-                            }
+        logger.info("3️⃣ Creando registro con archivo real adjunto...")
+        
+        properties = {
+            # Campo título - origin_chat_title
+            "Evento / Selección": {
+                "title": [
+                    {
+                        "text": {
+                            "content": title
                         }
-                    ]
-                },
-                # Fecha actual
-                "Fecha": {
-                    "date": {
-                        "start": datetime.now().isoformat()[:10]
                     }
-                },
-                # Estado inicial
-                "Resultado": {
-                    "select": {
-                        "name": "Pendiente"
+                ]
+            },
+            # Fecha actual
+            "Fecha": {
+                "date": {
+                    "start": today_iso or date.today().isoformat()
+                }
+            },
+            **self._PROPS_SKELETON,
+            # ARCHIVO REAL usando file_upload_id
+            "Captura / Comprobante": {
+                "files": [
+                    {
+                        "type": "file_upload",
+                        "file_upload": {
+                            "id": file_upload_id
+                        },
+                        "name": filename
                     }
-                },
-                # ARCHIVO REAL usando file_upload_id
-                "Captura / Comprobante": {
-                    "files": [
-                        {
-                            "type": "file_upload",
-                            "file_upload": {
-                                "id": file_upload_id
-                            },
-                            "name": filename
-                        }
-                    ]
-                },
-                # Información adicional
-                "Mercado / Selección": {
-                    "rich_text": [
-                        {
-                            "text": {
-                                "content": f"Test de subida REAL - Archivo: {filename}"
-                            }
+                ]
+            },
+            # Información adicional
+            "Mercado / Selección": {
+                "rich_text": [
+                    {
+                        "text": {
+                            "content": f"Test de subida REAL - Archivo: {filename}"
                         }
-                    ]
-                }
+                    }
+                ]
             }
+        }
+        
+        # Crear el registro con la misma sesión que subió el archivo
+        session = await self._get_session()
+        payload = {
+            "parent": {"database_id": self.database_id},
+            "properties": properties
+        }
+        async with self._sem:
+            async with session.post(f"{self.notion_api_base}/pages", json=payload) as http_response:
+                body = await http_response.read()
+                if http_response.status != 200:
+                    raise Exception(f"Error creando registro: {http_response.status} - {body.decode('utf-8', 'replace')}")
+                response = _json_loads(body)
+        
+        if isinstance(response, dict) and "id" in response:
+            page_id = response["id"]
+            page_url = response.get("url", "")
             
-            # Crear el registro
-            response = self.notion_client.pages.create(
-                parent={"database_id": self.database_id},
-                properties=properties
-            )
+            logger.info("✅ Registro creado con archivo REAL: %s (file_upload %s) %s", page_id, file_upload_id, page_url)
             
-            if isinstance(response, dict) and "id" in response:
-                page_id = response["id"]
-                page_url = response.get("url", "")
-                
-                logger.info(f"✅ Registro creado con archivo REAL:")
-                logger.info(f"   Page ID: {page_id}")
-                logger.info(f"   URL: {page_url}")
-                logger.info(f"   File Upload ID: {file_upload_id}")
-                
-                return page_id
-            else:
-                raise Exception("Respuesta inesperada de Notion API")
-                
-        except Exception as e:
-            logger.error(f"❌ Error creando registro: {e}")
-            raise
+            return page_id
+        else:
+            raise Exception("Respuesta inesperada de Notion API")
     
-    def test_connection(self) -> bool:
+    async def run_batch(self, paths: List[Path]) -> list:
+        """
+        Sube varios archivos y crea su registro en paralelo (máximo 3 peticiones
+        simultáneas a Notion). El fallo de un archivo no detiene al resto.
+        La sesión queda abierta: el llamador debe cerrarla con close()
+        
+        Returns:
+            page_id de cada archivo, o la excepción que lo hizo fallar
+        """
+        today_iso = date.today().isoformat()
+        
+        async def upload_one(file_path: Path) -> str:
+            file_upload_id = await self.upload_file_real(file_path)
+            return await self.create_record_with_real_file(
+                title=f"TEST REAL - {file_path.name}",
+                file_upload_id=file_upload_id,
+                filename=file_path.name,
+                today_iso=today_iso
+            )
+        
+        results = await asyncio.gather(*map(upload_one, paths), return_exceptions=True)
+        
+        for file_path, result in zip(paths, results):
+            if isinstance(result, Exception):
+                logger.error("❌ %s: %s", file_path.name, result)
+        ok = sum(not isinstance(result, Exception) for result in results)
+        logger.info("📊 Lote completado: %d/%d registros creados", ok, len(paths))
+        return results
+    
+    async def test_connection(self) -> bool:
         """Prueba la conexión con Notion"""
         try:
-            response = self.notion_client.databases.retrieve(self.database_id)
+            session = await self._get_session()
+            async with session.get(f"{self.notion_api_base}/databases/{self.database_id}") as http_response:
+                body = await http_response.read()
+                if http_response.status != 200:
+                    raise Exception(f"{http_response.status} - {body.decode('utf-8', 'replace')}")
+            
+            # Un esquema con muchas propiedades se decodifica en un hilo para no frenar el event loop
+            if len(body) > self._THREAD_PARSE_THRESHOLD:
+                response = await asyncio.to_thread(_json_loads, body)
+            else:
+                response = _json_loads(body)
+            
             if isinstance(response, dict):
                 title = "Base de datos de Apuestas"
                 if "title" in response and response["title"]:
                     title = response["title"][0].get("plain_text", title)
                 
-                logger.info(f"✅ Conexión exitosa con: {title}")
+                logger.info("✅ Conexión exitosa con: %s", title)
                 return True
         except Exception as e:
-            logger.error(f"❌ Error conectando con Notion: {e}")
+            logger.error("❌ Error conectando con Notion: %s", e)
             return False
     
     async def run_complete_test(self):
@@ -222,10 +415,13 @@ class NotionRealUploadTester:
         logger.info("🧪 INICIANDO TEST DE SUBIDA REAL DE ARCHIVOS")
         print("="*80)
         
+        # Fecha de los registros, calculada una vez por ejecución
+        today_iso = date.today().isoformat()
+        
         try:
             # 1. Test de conexión
             logger.info("Paso 0: Probando conexión...")
-            if not self.test_connection():
+            if not await self.test_connection():
                 raise Exception("No se pudo conectar con Notion")
             
             # 2. Buscar archivo de prueba
@@ -233,38 +429,45 @@ class NotionRealUploadTester:
             images_folder = Path("storage/images")
             test_file = None
             
+            # scandir recorre el directorio en una sola pasada y solo crea
+            # un Path para el archivo elegido (sin distinguir mayúsculas)
             if images_folder.exists():
-                for file_path in images_folder.glob("*"):
-                    if file_path.suffix.lower() in ['.jpg', '.jpeg', '.png', '.gif']:
-                        test_file = file_path
-                        break
+                with os.scandir(images_folder) as entries:
+                    test_file = next(
+                        (Path(entry.path) for entry in entries
+                         if os.path.splitext(entry.name)[1].lower() in self._IMAGE_EXTS),
+                        None
+                    )
             
             if not test_file:
                 raise Exception("No hay archivos de prueba en 'images'")
             
-            logger.info(f"📁 Usando archivo: {test_file.name}")
+            logger.info("📁 Usando archivo: %s", test_file.name)
             
             # 3. Ejecutar subida real (3 pasos)
             file_upload_id = await self.upload_file_real(test_file)
             
             # 4. Crear registro con archivo real
             origin_chat_title = f"TEST REAL - {test_file.name}"
-            page_id = self.create_record_with_real_file(
+            page_id = await self.create_record_with_real_file(
                 title=origin_chat_title,
                 file_upload_id=file_upload_id,
-                filename=test_file.name
+                filename=test_file.name,
+                today_iso=today_iso
             )
             
             logger.info("🎉 TEST COMPLETADO EXITOSAMENTE")
-            logger.info(f"Título: {origin_chat_title}")
-            logger.info(f"Page ID: {page_id}")
-            logger.info(f"File Upload ID: {file_upload_id}")
+            logger.info("Título: %s", origin_chat_title)
+            logger.info("Page ID: %s", page_id)
+            logger.info("File Upload ID: %s", file_upload_id)
             
             return True
             
         except Exception as e:
-            logger.error(f"❌ TEST FALLIDO: {e}")
+            logger.error("❌ TEST FALLIDO: %s", e)
             return False
+        finally:
+            await self.close()
 
 
 async def main():
@@ -275,7 +478,17 @@ async def main():
         print("="*80)
         
         tester = NotionRealUploadTester()
-        success = await tester.run_complete_test()
+        
+        # Con rutas como argumentos se suben todas en lote; sin ellas, el test completo
+        paths = [Path(arg) for arg in sys.argv[1:]]
+        if paths:
+            try:
+                results = await tester.run_batch(paths)
+            finally:
+                await tester.close()
+            success = not any(isinstance(result, Exception) for result in results)
+        else:
+            success = await tester.run_complete_test()
         
         print("\n" + "="*80)
         if success:
@@ -288,9 +501,11 @@ async def main():
         print("="*80)
         
     except Exception as e:
-        logger.error(f"Error: {e}")
+        logger.error("Error: %s", e)
         print(f"\n❌ Error: {e}")
 
 
 if __name__ == "__main__":
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
     asyncio.run(main())
\ No newline at end of file